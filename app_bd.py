@@ -1,9 +1,28 @@
+import time
+
+# Marca o início da execução do script (antes dos imports pesados) para medir o
+# tempo até a primeira página renderizada, incluindo o custo de importação.
+INICIO_EXECUCAO = time.perf_counter()
+
 import streamlit as st
 import psycopg2
-from sentence_transformers import SentenceTransformer
+from psycopg2.extras import execute_values
 import pandas as pd
+import numpy as np
 import bcrypt
-import time
+import os
+import threading
+import itertools
+import json
+import atexit
+import queue
+import uuid
+from concurrent.futures import Future
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # --- 1. Configuração da Página e Funções de Cache ---
 
@@ -13,26 +32,331 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-@st.cache_resource
+# Configuração do modelo de IA. O modelo fica salvo em uma pasta local fixa
+# (gerada por scripts/exportar_modelo.py) para não depender da internet.
+NOME_MODELO = 'all-MiniLM-L6-v2'
+PASTA_MODELOS = os.environ.get(
+    'LEITOR_PASTA_MODELOS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modelos')
+)
+CAMINHO_MODELO_LOCAL = os.path.join(PASTA_MODELOS, NOME_MODELO)
+# 'torch' (padrão) ou 'onnx' para usar o modelo exportado e quantizado.
+BACKEND_MODELO = os.environ.get('LEITOR_BACKEND_MODELO', 'torch')
+
+def arquivo_onnx():
+    """Arquivo ONNX do backend 'onnx': o de LEITOR_ARQUIVO_ONNX, o escolhido por
+    scripts/exportar_modelo.py ou, por padrão, o da quantização LEITOR_QUANTIZACAO."""
+    if os.environ.get('LEITOR_ARQUIVO_ONNX'):
+        return os.environ['LEITOR_ARQUIVO_ONNX']
+    caminho_escolha = os.path.join(CAMINHO_MODELO_LOCAL, 'arquivo_onnx.txt')
+    if os.path.exists(caminho_escolha):
+        with open(caminho_escolha, encoding='utf-8') as f:
+            return f.read().strip()
+    return f"onnx/model_qint8_{os.environ.get('LEITOR_QUANTIZACAO', 'avx512_vnni')}.onnx"
+
 def carregar_modelo():
-    """Carrega o modelo de IA SentenceTransformer uma única vez."""
-    print("Carregando modelo de IA...")
-    try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("Modelo carregado.")
-        return model
-    except Exception as e:
-        st.error(f"Não foi possível baixar o modelo de IA. Verifique sua conexão. Erro: {e}")
-        return None
+    """Carrega o modelo de IA SentenceTransformer (chamada em segundo plano)."""
+    if os.path.isdir(CAMINHO_MODELO_LOCAL):
+        # Com a cópia local presente, nenhuma requisição ao Hugging Face Hub é necessária.
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+        origem = CAMINHO_MODELO_LOCAL
+    else:
+        origem = NOME_MODELO
+    # Import tardio: carregar o torch/sentence-transformers é a parte mais lenta da inicialização.
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Carregando modelo de IA ({origem}, backend={BACKEND_MODELO})...")
+    if BACKEND_MODELO == 'onnx':
+        model = SentenceTransformer(
+            origem, backend='onnx', cache_folder=PASTA_MODELOS,
+            model_kwargs={'file_name': arquivo_onnx()}
+        )
+    else:
+        model = SentenceTransformer(origem, cache_folder=PASTA_MODELOS)
+    print("Modelo carregado.")
+    return model
+
+# Após uma falha (ex.: rede fora do ar), uma nova tentativa só é feita depois deste intervalo.
+INTERVALO_NOVA_TENTATIVA_MODELO_S = 30.0
+
+class CarregadorModelo:
+    """Carrega o modelo em uma thread de fundo apenas quando a busca vetorial é necessária."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pronto = threading.Event()
+        self._thread = None
+        self._falhou_em = float('-inf')
+        self.modelo = None
+        self.erro = None
+
+    def iniciar(self):
+        """Dispara o carregamento em segundo plano. Chamadas repetidas não têm efeito,
+        exceto após uma falha, quando o carregamento é tentado novamente."""
+        with self._lock:
+            if self._thread is not None:
+                if self.modelo is not None or self._thread.is_alive() or not self._pronto.is_set():
+                    return
+                if time.monotonic() - self._falhou_em < INTERVALO_NOVA_TENTATIVA_MODELO_S:
+                    return
+            self.erro = None
+            self._pronto.clear()
+            self._thread = threading.Thread(target=self._carregar, name="carregador-modelo", daemon=True)
+            self._thread.start()
+
+    def _carregar(self):
+        inicio = time.perf_counter()
+        try:
+            self.modelo = carregar_modelo()
+            print(f"Modelo pronto em {time.perf_counter() - inicio:.2f} s.")
+        except Exception as e:
+            self.erro = e
+            self._falhou_em = time.monotonic()
+            print(f"ERRO AO CARREGAR MODELO: {e}")
+        finally:
+            self._pronto.set()
+
+    def obter(self, timeout=None):
+        """Retorna o modelo, aguardando o fim do carregamento se necessário."""
+        self.iniciar()
+        self._pronto.wait(timeout)
+        return self.modelo
+
+@st.cache_resource
+def obter_carregador_modelo():
+    """Cria um único carregador de modelo compartilhado por todas as sessões."""
+    return CarregadorModelo()
+
+# Micro-batching dos encodes: pedidos concorrentes de várias sessões são agrupados
+# por até LEITOR_ESPERA_LOTE_MS milissegundos em um único encode em lote.
+TAMANHO_MAX_LOTE = int(os.environ.get('LEITOR_TAMANHO_LOTE', '32'))
+ESPERA_MAX_LOTE_MS = float(os.environ.get('LEITOR_ESPERA_LOTE_MS', '5'))
+
+class ServicoCodificacao:
+    """Serviço compartilhado que agrupa pedidos de encode em lotes."""
+
+    def __init__(self, carregador, tamanho_max_lote=TAMANHO_MAX_LOTE, espera_max_ms=ESPERA_MAX_LOTE_MS):
+        self._carregador = carregador
+        self.tamanho_max_lote = max(1, tamanho_max_lote)
+        self.espera_max_s = max(0.0, espera_max_ms) / 1000
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.total_lotes = 0
+        self.total_pedidos = 0
+        self.maior_lote = 0
+
+    def codificar(self, texto, timeout=None):
+        """Enfileira um texto e devolve o seu vetor assim que o lote for processado."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="servico-codificacao", daemon=True)
+                self._thread.start()
+        futuro = Future()
+        self._fila.put((texto, futuro))
+        return futuro.result(timeout)
+
+    def _loop(self):
+        while True:
+            # Bloqueia até o primeiro pedido e então espera pelos demais até o prazo do lote.
+            lote = [self._fila.get()]
+            prazo = time.perf_counter() + self.espera_max_s
+            while len(lote) < self.tamanho_max_lote:
+                restante = prazo - time.perf_counter()
+                try:
+                    lote.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            self._processar(lote)
+
+    def _processar(self, lote):
+        textos = [texto for texto, _ in lote]
+        try:
+            modelo = self._carregador.obter()
+            if modelo is None:
+                raise RuntimeError(f"Modelo de IA indisponível: {self._carregador.erro}")
+            vetores = modelo.encode(textos, batch_size=len(textos))
+        except Exception as e:
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        for (_, futuro), vetor in zip(lote, vetores):
+            futuro.set_result(vetor)
+
+        with self._lock:
+            self.total_lotes += 1
+            self.total_pedidos += len(lote)
+            self.maior_lote = max(self.maior_lote, len(lote))
+        if self.total_lotes % 100 == 0:
+            print(f"Codificação: {self.metricas()}")
+
+    def metricas(self):
+        """Resumo dos lotes processados, incluindo a taxa média de preenchimento."""
+        with self._lock:
+            lotes, pedidos = self.total_lotes, self.total_pedidos
+            return {
+                'lotes': lotes,
+                'pedidos': pedidos,
+                'media_por_lote': pedidos / lotes if lotes else 0.0,
+                'taxa_preenchimento': pedidos / (lotes * self.tamanho_max_lote) if lotes else 0.0,
+                'maior_lote': self.maior_lote,
+            }
+
+@st.cache_resource
+def obter_servico_codificacao():
+    """Cria um único serviço de codificação compartilhado por todas as sessões."""
+    return ServicoCodificacao(obter_carregador_modelo())
+
+# Motor da busca vetorial: 'postgres' (padrão, pgvector) ou 'mmap' (busca em processo sobre
+# a matriz exportada por scripts/exportar_indice_vetorial.py, compartilhada via page cache).
+MOTOR_VETORIAL = os.environ.get('LEITOR_MOTOR_VETORIAL', 'postgres')
+PASTA_INDICE = os.environ.get(
+    'LEITOR_PASTA_INDICE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'indice_vetorial')
+)
+LINHAS_POR_BLOCO = 65536
+INTERVALO_VERIFICACAO_INDICE_S = 5.0
+
+class IndiceVetorial:
+    """Busca top-k exata (distância L2, como o `<->` do pgvector) sobre segmentos .npy abertos com mmap."""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+        self._segmentos = []
+        self._versao_manifesto = None
+        self._ultima_verificacao = float('-inf')
+
+    def _carregar_segmentos(self):
+        """Reabre os segmentos quando o manifesto muda (novo snapshot ou delta)."""
+        with self._lock:
+            if time.monotonic() - self._ultima_verificacao < INTERVALO_VERIFICACAO_INDICE_S:
+                return self._segmentos
+            self._ultima_verificacao = time.monotonic()
+            caminho_manifesto = os.path.join(self.pasta, 'manifesto.json')
+            try:
+                versao = os.stat(caminho_manifesto).st_mtime_ns
+                if versao == self._versao_manifesto:
+                    return self._segmentos
+                with open(caminho_manifesto, encoding='utf-8') as f:
+                    manifesto = json.load(f)
+                segmentos = []
+                for seg in manifesto['segmentos']:
+                    base = os.path.join(self.pasta, seg['nome'])
+                    segmentos.append({
+                        'isbns': np.load(base + '_isbns.npy', mmap_mode='r'),
+                        'vetores': np.load(base + '_vetores.npy', mmap_mode='r'),
+                        'normas': np.load(base + '_normas.npy', mmap_mode='r'),
+                        'removidos': np.load(base + '_removidos.npy'),
+                    })
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Índice vetorial indisponível, usando o PostgreSQL: {e}")
+                return self._segmentos
+
+            # Um ISBN só vale no segmento mais recente em que aparece (ou em que foi removido).
+            substituidos = set()
+            for seg in reversed(segmentos):
+                seg['validos'] = ~np.isin(seg['isbns'], list(substituidos)) if substituidos else None
+                substituidos.update(seg['isbns'].tolist())
+                substituidos.update(seg['removidos'].tolist())
+            self._segmentos = segmentos
+            self._versao_manifesto = versao
+            print(f"Índice vetorial carregado: {sum(len(seg['isbns']) for seg in segmentos)} vetores "
+                  f"em {len(segmentos)} segmento(s).")
+            return self._segmentos
+
+    def buscar_lote(self, consultas, k):
+        """
+        Retorna, para cada consulta, a lista [(isbn, distancia)] dos k vizinhos mais próximos,
+        ou None se não houver índice exportado.
+        """
+        segmentos = self._carregar_segmentos()
+        if not segmentos:
+            return None
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+        distancias, isbns = [], []
+        for seg in segmentos:
+            for inicio in range(0, len(seg['isbns']), LINHAS_POR_BLOCO):
+                fim = min(inicio + LINHAS_POR_BLOCO, len(seg['isbns']))
+                # ||x - q||² = ||x||² - 2 x·q + ||q||² (o termo ||q||² é somado no final).
+                d2 = seg['normas'][inicio:fim, None] - 2.0 * (seg['vetores'][inicio:fim] @ consultas.T)
+                if seg['validos'] is not None:
+                    d2[~seg['validos'][inicio:fim]] = np.inf
+                kk = min(k, fim - inicio)
+                idx = np.argpartition(d2, kk - 1, axis=0)[:kk]
+                distancias.append(np.take_along_axis(d2, idx, axis=0))
+                isbns.append(np.asarray(seg['isbns'][inicio:fim])[idx])
+        if not distancias:
+            return None
+        distancias = np.concatenate(distancias) + np.einsum('ij,ij->i', consultas, consultas)[None, :]
+        isbns = np.concatenate(isbns)
+
+        resultados = []
+        for b in range(consultas.shape[0]):
+            kk = min(k, len(distancias))
+            melhores = np.argpartition(distancias[:, b], kk - 1)[:kk]
+            melhores = melhores[np.argsort(distancias[melhores, b])]
+            resultados.append([
+                (str(isbns[i, b]), float(np.sqrt(max(distancias[i, b], 0.0))))
+                for i in melhores if np.isfinite(distancias[i, b])
+            ])
+        return resultados
+
+    def buscar(self, consulta, k):
+        resultados = self.buscar_lote(consulta, k)
+        return resultados[0] if resultados is not None else None
+
+@st.cache_resource
+def obter_indice_vetorial():
+    """Abre o índice vetorial uma única vez por processo; os arquivos são compartilhados via page cache."""
+    return IndiceVetorial(PASTA_INDICE)
+
+@st.cache_resource
+def metricas_inicializacao():
+    """Guarda métricas de inicialização do processo (ex.: cold start)."""
+    return {'primeira_renderizacao_s': None}
+
+# Roteamento leitura/escrita: escritas (cadastro e avaliações) vão sempre para o primário;
+# buscas e login vão para as réplicas (ex.: "localhost:5433,localhost:5434").
+HOST_PRIMARIO, PORTA_PRIMARIO = os.environ.get('LEITOR_BD_PRIMARIO', 'localhost:5432').split(':')
+REPLICAS_BD = [e.strip() for e in os.environ.get('LEITOR_BD_REPLICAS', '').split(',') if e.strip()]
+# Réplicas mais atrasadas do que isso (em segundos) são ignoradas até alcançarem o primário.
+LAG_MAXIMO_S = float(os.environ.get('LEITOR_LAG_MAXIMO_S', '5'))
+INTERVALO_VERIFICACAO_LAG_S = 2.0
+
+PARAMETROS_BD = dict(host=HOST_PRIMARIO, port=PORTA_PRIMARIO, dbname="book_crossing_db", user="user", password="password")
+
+# Estado da réplica comparado com a posição atual do WAL no primário (parâmetro):
+# em recuperação?, receptor de WAL em streaming?, bytes ainda não aplicados,
+# segundos desde a última transação aplicada e posição do WAL já aplicado.
+SQL_ESTADO_REPLICA = """
+    SELECT
+        pg_is_in_recovery(),
+        COALESCE((SELECT pid IS NOT NULL AND COALESCE(status, 'streaming') = 'streaming'
+                  FROM pg_stat_wal_receiver), false),
+        pg_wal_lsn_diff(%s::pg_lsn, pg_last_wal_replay_lsn()),
+        EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()),
+        pg_last_wal_replay_lsn()
+"""
+
+def lsn_para_int(lsn):
+    """Converte um pg_lsn ('16/B374D848') em inteiro, para comparar posições do WAL."""
+    alto, baixo = lsn.split('/')
+    return (int(alto, 16) << 32) + int(baixo, 16)
+
+def lsn_apos_commit(conexao):
+    """Posição do WAL no primário logo após um commit desta conexão; o commit já está nela."""
+    with conexao.cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn()")
+        lsn = cur.fetchone()[0]
+    conexao.commit()
+    return lsn_para_int(lsn)
 
 @st.cache_resource
 def iniciar_conexao_bd():
     """Inicia a conexão com o banco de dados PostgreSQL uma única vez."""
     print("Iniciando conexão com o BD...")
     try:
-        conn = psycopg2.connect(
-            host="localhost", port="5432", dbname="book_crossing_db", user="user", password="password"
-        )
+        conn = psycopg2.connect(**PARAMETROS_BD)
         print("Conexão bem-sucedida.")
         return conn
     except psycopg2.OperationalError as e:
@@ -40,32 +364,502 @@ def iniciar_conexao_bd():
         st.warning("Verifique se o seu container Docker com o PostgreSQL está rodando (`docker-compose up -d`).")
         return None
 
+# Write-behind das avaliações: as notas vão para uma fila em memória (com journal
+# local em disco) e são gravadas no banco em upserts de várias linhas.
+WRITE_BEHIND_AVALIACOES = os.environ.get('LEITOR_WRITE_BEHIND', '0') == '1'
+LOTE_AVALIACOES = int(os.environ.get('LEITOR_AVALIACOES_LOTE', '200'))
+INTERVALO_AVALIACOES_S = float(os.environ.get('LEITOR_AVALIACOES_INTERVALO_S', '1.0'))
+# Com o banco fora do ar, a espera entre tentativas dobra a partir do intervalo até este limite.
+ESPERA_MAX_ERRO_AVALIACOES_S = 30.0
+# Um journal por processo (vários workers do Streamlit podem rodar ao mesmo tempo).
+PASTA_JOURNAL_AVALIACOES = os.environ.get(
+    'LEITOR_PASTA_JOURNAL_AVALIACOES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal_avaliacoes')
+)
+
+def travar_arquivo(arquivo):
+    """Tenta um lock exclusivo, sem esperar, no arquivo aberto. Retorna False se outro processo o detém."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+class ServicoAvaliacoes:
+    """Buffer write-behind das avaliações, com journal local para não perder notas confirmadas."""
+
+    UPSERT_SQL = """
+        INSERT INTO Avaliacoes (id_usuario, isbn_livro, avaliacao)
+        VALUES %s
+        ON CONFLICT (id_usuario, isbn_livro) DO UPDATE SET avaliacao = EXCLUDED.avaliacao;
+    """
+
+    def __init__(self, pasta_journal, tamanho_lote=LOTE_AVALIACOES, intervalo_s=INTERVALO_AVALIACOES_S):
+        self.pasta_journal = pasta_journal
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.intervalo_s = intervalo_s
+        # Chave (id_usuario, isbn) -> nota; notas repetidas do mesmo usuário/livro são agrupadas.
+        self._pendentes = {}
+        # Lote sendo gravado agora: continua visível para o usuário até o commit.
+        self._em_gravacao = {}
+        self._lock = threading.Lock()
+        self._condicao = threading.Condition(self._lock)
+        self._lock_gravacao = threading.Lock()
+        self._conn = None
+        # id_usuario -> LSN do último commit com notas dele (leitura nas réplicas só depois dele).
+        self._lsn_commit = {}
+        # Group commit do journal: linhas escritas x linhas já com fsync, e um único fsync por vez.
+        self._seq_escrito = 0
+        self._seq_sincronizado = 0
+        self._fsync_em_andamento = False
+        self._condicao_fsync = threading.Condition(self._lock)
+
+        os.makedirs(pasta_journal, exist_ok=True)
+        base = os.path.join(pasta_journal, f"avaliacoes_pendentes.{os.getpid()}_{uuid.uuid4().hex[:8]}")
+        self.caminho_journal = base + '.jsonl'
+        # O lock fica preso enquanto o processo viver; journals sem dono são de processos encerrados.
+        self._arquivo_lock = open(base + '.lock', 'a+')
+        travar_arquivo(self._arquivo_lock)
+        orfaos = self._recuperar_journals_orfaos()
+        # Começa sempre com um journal novo e limpo, sem linhas parciais de uma queda anterior.
+        self._journal = open(self.caminho_journal, 'a', encoding='utf-8')
+        with self._lock:
+            self._reescrever_journal()
+        # Só depois das notas recuperadas estarem no journal novo os arquivos órfãos são apagados.
+        for caminho, arquivo_lock in orfaos:
+            os.remove(caminho)
+            arquivo_lock.close()
+            os.remove(arquivo_lock.name)
+        threading.Thread(target=self._loop, name="write-behind-avaliacoes", daemon=True).start()
+        atexit.register(self._encerrar)
+
+    def _recuperar_journals_orfaos(self):
+        """Recarrega as avaliações confirmadas de processos que caíram antes de gravá-las no banco."""
+        orfaos = []
+        for nome in sorted(os.listdir(self.pasta_journal)):
+            caminho = os.path.join(self.pasta_journal, nome)
+            if not (nome.startswith('avaliacoes_pendentes.') and nome.endswith('.jsonl')) or caminho == self.caminho_journal:
+                continue
+            arquivo_lock = open(caminho[:-len('.jsonl')] + '.lock', 'a+')
+            if not travar_arquivo(arquivo_lock):
+                arquivo_lock.close()
+                continue  # Journal de outro processo ainda ativo.
+            try:
+                with open(caminho, encoding='utf-8') as f:
+                    linhas = f.readlines()
+            except FileNotFoundError:
+                arquivo_lock.close()
+                continue  # Já recuperado por outro processo.
+            for linha in linhas:
+                try:
+                    id_usuario, isbn, avaliacao = json.loads(linha)
+                except ValueError:
+                    continue  # Última linha incompleta (queda no meio da escrita), nunca confirmada.
+                self._pendentes[(id_usuario, isbn)] = avaliacao
+            # O lock do órfão fica preso até ele ser apagado, para nenhum outro processo recuperá-lo também.
+            orfaos.append((caminho, arquivo_lock))
+        if self._pendentes:
+            print(f"Journal: {len(self._pendentes)} avaliações pendentes recuperadas de {len(orfaos)} arquivo(s).")
+        return orfaos
+
+    def registrar(self, id_usuario, isbn, avaliacao):
+        """Grava a avaliação no journal e a enfileira; retorna após ela estar durável (fsync)."""
+        with self._condicao:
+            self._journal.write(json.dumps([id_usuario, isbn, avaliacao]) + "\n")
+            self._journal.flush()
+            self._seq_escrito += 1
+            seq = self._seq_escrito
+            self._pendentes[(id_usuario, isbn)] = avaliacao
+            if len(self._pendentes) >= self.tamanho_lote:
+                self._condicao.notify()
+        self._aguardar_fsync(seq)
+
+    def _aguardar_fsync(self, seq):
+        """
+        Espera a linha seq do journal chegar ao disco. O fsync roda fora do lock do serviço;
+        quem chega durante um fsync espera o próximo, que cobre todas as linhas já escritas.
+        """
+        while True:
+            with self._lock:
+                while self._fsync_em_andamento and self._seq_sincronizado < seq:
+                    self._condicao_fsync.wait()
+                if self._seq_sincronizado >= seq:
+                    return
+                self._fsync_em_andamento = True
+                alvo = self._seq_escrito
+                # O journal não é reescrito nem fechado enquanto houver um fsync em andamento.
+                fd = self._journal.fileno()
+            sincronizado = False
+            try:
+                os.fsync(fd)
+                sincronizado = True
+            finally:
+                with self._lock:
+                    self._fsync_em_andamento = False
+                    if sincronizado:
+                        self._seq_sincronizado = max(self._seq_sincronizado, alvo)
+                    self._condicao_fsync.notify_all()
+
+    def lsn_do_usuario(self, id_usuario):
+        """LSN do último commit do write-behind com notas do usuário (0 se nenhum)."""
+        with self._lock:
+            return self._lsn_commit.get(id_usuario, 0)
+
+    def pendentes_do_usuario(self, id_usuario):
+        """Notas do usuário ainda não confirmadas no banco (isbn -> nota)."""
+        with self._lock:
+            notas = {**self._em_gravacao, **self._pendentes}
+        return {isbn: nota for (usuario, isbn), nota in notas.items() if usuario == id_usuario}
+
+    def _loop(self):
+        while True:
+            with self._condicao:
+                self._condicao.wait_for(lambda: len(self._pendentes) >= self.tamanho_lote, timeout=self.intervalo_s)
+            espera = max(self.intervalo_s, 0.1)
+            while not self.gravar():
+                # Banco indisponível: espera crescente, sem voltar ao wait_for (a condição continuaria
+                # verdadeira com a fila cheia e o loop tentaria conectar sem parar).
+                time.sleep(espera)
+                espera = min(espera * 2, ESPERA_MAX_ERRO_AVALIACOES_S)
+
+    def gravar(self):
+        """Grava as avaliações pendentes em um único upsert de várias linhas.
+        Retorna False se o lote voltou para a fila por erro no banco."""
+        with self._lock_gravacao:
+            with self._lock:
+                if not self._pendentes:
+                    return True
+                self._em_gravacao = lote = self._pendentes
+                self._pendentes = {}
+            linhas = [(u, i, n) for (u, i), n in lote.items()]
+            try:
+                if self._conn is None or self._conn.closed:
+                    self._conn = psycopg2.connect(**PARAMETROS_BD)
+                try:
+                    with self._conn.cursor() as cur:
+                        execute_values(cur, self.UPSERT_SQL, linhas, page_size=len(linhas))
+                except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                    # Erro permanente em alguma linha (ex.: livro/usuário apagado): grava linha a linha
+                    # e descarta apenas as linhas inválidas, para não travar as notas dos demais.
+                    print(f"ERRO NO WRITE-BEHIND DE AVALIAÇÕES, gravando linha a linha: {e}")
+                    self._conn.rollback()
+                    self._gravar_linha_a_linha(linhas)
+                self._conn.commit()
+                # Se esta leitura falhar, o lote volta à fila e é regravado (o upsert é idempotente).
+                lsn = lsn_apos_commit(self._conn)
+            except Exception as e:
+                print(f"ERRO NO WRITE-BEHIND DE AVALIAÇÕES: {e}")
+                if self._conn is not None and not self._conn.closed:
+                    self._conn.rollback()
+                with self._lock:
+                    # Devolve o lote à fila sem sobrescrever notas mais recentes.
+                    for chave, nota in lote.items():
+                        self._pendentes.setdefault(chave, nota)
+                    self._em_gravacao = {}
+                return False
+            with self._lock:
+                # O LSN é registrado antes das notas saírem de _em_gravacao: quem não as vê mais
+                # como pendentes já enxerga o LSN que exige uma réplica em dia com elas.
+                for id_usuario, _ in lote:
+                    self._lsn_commit[id_usuario] = lsn
+                self._em_gravacao = {}
+                self._reescrever_journal()
+            return True
+
+    def _gravar_linha_a_linha(self, linhas):
+        with self._conn.cursor() as cur:
+            for linha in linhas:
+                cur.execute("SAVEPOINT avaliacao")
+                try:
+                    execute_values(cur, self.UPSERT_SQL, [linha])
+                except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT avaliacao")
+                    print(f"Avaliação descartada {linha}: {e}")
+                else:
+                    cur.execute("RELEASE SAVEPOINT avaliacao")
+
+    def _reescrever_journal(self):
+        """Substitui o journal atomicamente, mantendo apenas o que ainda está pendente (chamar com o lock)."""
+        while self._fsync_em_andamento:
+            self._condicao_fsync.wait()
+        temporario = self.caminho_journal + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            for (id_usuario, isbn), avaliacao in self._pendentes.items():
+                f.write(json.dumps([id_usuario, isbn, avaliacao]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(temporario, self.caminho_journal)
+        self._journal = open(self.caminho_journal, 'a', encoding='utf-8')
+        # O journal novo já foi sincronizado com tudo o que está pendente.
+        self._seq_sincronizado = self._seq_escrito
+        self._condicao_fsync.notify_all()
+
+    def _encerrar(self):
+        """Na saída normal do processo, grava o que falta e remove o journal se ficou vazio."""
+        self.gravar()
+        with self._lock:
+            if self._pendentes:
+                return
+            while self._fsync_em_andamento:
+                self._condicao_fsync.wait()
+            self._journal.close()
+            os.remove(self.caminho_journal)
+        self._arquivo_lock.close()
+        os.remove(self._arquivo_lock.name)
+
+@st.cache_resource
+def obter_servico_avaliacoes():
+    """Cria um único buffer de avaliações compartilhado por todas as sessões."""
+    return ServicoAvaliacoes(PASTA_JOURNAL_AVALIACOES)
+
+class RoteadorBD:
+    """Distribui as consultas de leitura entre as réplicas (round-robin), voltando ao primário se necessário.
+    O estado das réplicas é verificado por uma thread de fundo, fora do caminho das requisições."""
+
+    def __init__(self, primario, replicas, lag_maximo_s=LAG_MAXIMO_S):
+        self.primario = primario
+        self.replicas = replicas
+        self.lag_maximo_s = lag_maximo_s
+        self._conexoes = {}
+        self._lags = {}
+        self._lsns = {}
+        self._conexao_verificacao = None
+        self._contador = itertools.count()
+        self._lock = threading.Lock()
+        if replicas:
+            threading.Thread(target=self._loop_verificacao, name="verificacao-replicas", daemon=True).start()
+
+    def leitura(self, lsn_minimo=0):
+        """Conexão de leitura: uma réplica saudável, em dia e que já aplicou o WAL até lsn_minimo
+        (o último commit da sessão), ou o primário."""
+        with self._lock:
+            disponiveis = [
+                self._conexoes[endereco] for endereco in self.replicas
+                if endereco in self._conexoes and self._lags.get(endereco, float('inf')) <= self.lag_maximo_s
+                and self._lsns.get(endereco, -1) >= lsn_minimo
+            ]
+        if not disponiveis:
+            return self.primario
+        return disponiveis[next(self._contador) % len(disponiveis)]
+
+    def marcar_falha(self, conexao):
+        """Tira de uso a réplica cuja consulta falhou; a thread de verificação a reconecta depois."""
+        with self._lock:
+            for endereco, conexao_replica in list(self._conexoes.items()):
+                if conexao_replica is conexao:
+                    self._lags[endereco] = float('inf')
+                    del self._conexoes[endereco]
+        if not conexao.closed:
+            conexao.close()
+
+    def _loop_verificacao(self):
+        while True:
+            self._verificar_replicas()
+            time.sleep(INTERVALO_VERIFICACAO_LAG_S)
+
+    def _lsn_primario(self):
+        """Posição atual do WAL no primário, lida por uma conexão própria (autocommit)."""
+        if self._conexao_verificacao is None or self._conexao_verificacao.closed:
+            self._conexao_verificacao = psycopg2.connect(**PARAMETROS_BD, connect_timeout=2)
+            self._conexao_verificacao.autocommit = True
+        with self._conexao_verificacao.cursor() as cur:
+            cur.execute("SELECT pg_current_wal_lsn()")
+            return cur.fetchone()[0]
+
+    def _verificar_replicas(self):
+        try:
+            lsn_primario = self._lsn_primario()
+        except psycopg2.Error as e:
+            # Sem a posição do primário não há como medir o atraso: as leituras também vão ao primário.
+            print(f"Não foi possível consultar o WAL do primário: {e}")
+            if self._conexao_verificacao is not None and not self._conexao_verificacao.closed:
+                self._conexao_verificacao.close()
+            lsn_primario = None
+        for endereco in self.replicas:
+            with self._lock:
+                conexao = self._conexoes.get(endereco)
+            try:
+                if conexao is None or conexao.closed:
+                    host, porta = endereco.split(':')
+                    conexao = psycopg2.connect(**{**PARAMETROS_BD, 'host': host, 'port': porta}, connect_timeout=2)
+                    # Sem transações abertas ociosas, que atrasariam a aplicação do WAL na réplica.
+                    conexao.autocommit = True
+                lag = float('inf')
+                lsn_replica = -1
+                if lsn_primario is not None:
+                    with conexao.cursor() as cur:
+                        cur.execute(SQL_ESTADO_REPLICA, (lsn_primario,))
+                        em_recuperacao, recebendo, bytes_pendentes, segundos, lsn_aplicado = cur.fetchone()
+                    if lsn_aplicado is not None:
+                        lsn_replica = lsn_para_int(lsn_aplicado)
+                    if not em_recuperacao or not recebendo:
+                        # Réplica promovida ou sem receber WAL (link caído, credenciais, WAL reciclado).
+                        lag = float('inf')
+                    elif bytes_pendentes <= 0:
+                        lag = 0.0
+                    elif segundos is not None:
+                        lag = float(segundos)
+                with self._lock:
+                    if lag > self.lag_maximo_s and self._lags.get(endereco, 0.0) <= self.lag_maximo_s:
+                        print(f"Réplica {endereco} atrasada ou sem replicação (lag={lag}), usando o primário.")
+                    self._conexoes[endereco] = conexao
+                    self._lags[endereco] = lag
+                    self._lsns[endereco] = lsn_replica
+            except psycopg2.Error as e:
+                with self._lock:
+                    if self._lags.get(endereco) != float('inf'):
+                        print(f"Réplica {endereco} indisponível, usando o primário: {e}")
+                    self._lags[endereco] = float('inf')
+                    self._conexoes.pop(endereco, None)
+                if conexao is not None and not conexao.closed:
+                    conexao.close()
+
+@st.cache_resource
+def obter_roteador_bd():
+    """Cria um único roteador de leitura compartilhado por todas as sessões."""
+    return RoteadorBD(iniciar_conexao_bd(), REPLICAS_BD)
+
 conn = iniciar_conexao_bd()
-modelo_ia = carregar_modelo()
+roteador_bd = obter_roteador_bd()
+servico_avaliacoes = obter_servico_avaliacoes() if WRITE_BEHIND_AVALIACOES else None
+carregador_modelo = obter_carregador_modelo()
+servico_codificacao = obter_servico_codificacao()
+indice_vetorial = obter_indice_vetorial() if MOTOR_VETORIAL == 'mmap' else None
 
 
 # --- 2. Funções de Banco de Dados (Busca, Inserção, Update) ---
 
+def conexao_leitura():
+    """Conexão para consultas somente leitura. Só usa uma réplica que já aplicou o último commit
+    da sessão (inclusive o das notas gravadas pelo write-behind), para o usuário ver o que gravou."""
+    lsn_minimo = st.session_state.get('lsn_escrita', 0)
+    id_usuario = st.session_state.get('user_id')
+    if servico_avaliacoes is not None and id_usuario is not None:
+        lsn_minimo = max(lsn_minimo, servico_avaliacoes.lsn_do_usuario(id_usuario))
+    return roteador_bd.leitura(lsn_minimo)
+
+def erro_de_conexao(e):
+    """Indica se a exceção (ou a causa, quando o pandas a embrulha) é uma falha de conexão."""
+    erros_conexao = (psycopg2.OperationalError, psycopg2.InterfaceError)
+    return isinstance(e, erros_conexao) or isinstance(e.__cause__, erros_conexao)
+
+def executar_no_primario(consulta):
+    """Executa consulta(conn); em caso de erro desfaz a transação, que travaria a conexão compartilhada."""
+    try:
+        return consulta(conn)
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+
+def executar_leitura(consulta):
+    """Executa consulta(conexao) na conexão de leitura; se a réplica falhar, repete no primário."""
+    conexao = conexao_leitura()
+    if conexao is conn:
+        return executar_no_primario(consulta)
+    try:
+        return consulta(conexao)
+    except Exception as e:
+        if not erro_de_conexao(e):
+            raise
+        print(f"Falha na réplica, repetindo a consulta no primário: {e}")
+        roteador_bd.marcar_falha(conexao)
+        return executar_no_primario(consulta)
+
+def ler_sql(query_sql, params):
+    """pd.read_sql_query roteado para as réplicas, com fallback para o primário."""
+    return executar_leitura(lambda conexao: pd.read_sql_query(query_sql, conexao, params=params))
+
+def registrar_escrita():
+    """Guarda o LSN do commit que acabou de ser feito em conn; as leituras da sessão esperam por ele."""
+    try:
+        st.session_state['lsn_escrita'] = lsn_apos_commit(conn)
+    except psycopg2.Error as e:
+        # Sem o LSN, as leituras da sessão ficam no primário até a próxima escrita.
+        print(f"Não foi possível ler o LSN do commit: {e}")
+        if not conn.closed:
+            conn.rollback()
+        st.session_state['lsn_escrita'] = float('inf')
+
 def buscar_livros(tipo_busca, termo_busca):
     """Função central que chama a rotina de busca apropriada."""
+    id_usuario = st.session_state.get('user_id')
+    # Notas pendentes lidas antes da busca: se o write-behind gravar uma delas no meio do caminho,
+    # ela aparece na média e em nota_usuario (mesmo snapshot) e é trocada por ela mesma.
+    pendentes = {}
+    if servico_avaliacoes is not None and id_usuario is not None:
+        pendentes = servico_avaliacoes.pendentes_do_usuario(id_usuario)
     if 'Título' in tipo_busca:
-        return buscar_livros_por_similaridade(termo_busca)
+        df = buscar_livros_por_similaridade(termo_busca, id_usuario=id_usuario)
     elif 'Autor' in tipo_busca:
-        return buscar_livros_por_autor(termo_busca)
+        df = buscar_livros_por_autor(termo_busca, id_usuario=id_usuario)
     elif 'Editora' in tipo_busca:
-        return buscar_livros_por_editora(termo_busca)
+        df = buscar_livros_por_editora(termo_busca, id_usuario=id_usuario)
     else: # ISBN
-        return buscar_livro_por_isbn(termo_busca)
+        df = buscar_livro_por_isbn(termo_busca, id_usuario=id_usuario)
+    return aplicar_avaliacoes_pendentes(df, pendentes)
+
+def aplicar_avaliacoes_pendentes(df, pendentes):
+    """
+    Inclui nas médias as notas do usuário que ainda estão no buffer write-behind (isbn -> nota).
+    A nota já gravada vem da coluna nota_usuario, lida na mesma consulta (e snapshot) das médias.
+    """
+    if not pendentes or df.empty:
+        return df
+    isbns = [isbn for isbn in df['isbn'] if isbn in pendentes]
+    if not isbns:
+        return df
+    df = df.copy()
+    for idx in df.index[df['isbn'].isin(isbns)]:
+        isbn = df.at[idx, 'isbn']
+        total = int(df.at[idx, 'total_avaliacoes'])
+        soma = float(df.at[idx, 'media_avaliacao']) * total
+        nota_antiga = df.at[idx, 'nota_usuario']
+        if pd.notna(nota_antiga) and nota_antiga > 0:  # Notas 0 (implícitas) não entram na média.
+            soma -= nota_antiga
+            total -= 1
+        soma += pendentes[isbn]
+        total += 1
+        df.at[idx, 'media_avaliacao'] = soma / total
+        df.at[idx, 'total_avaliacoes'] = total
+    return df
 
-def buscar_livros_por_similaridade(termo_busca, top_n=15):
-    if not conn or not modelo_ia: return pd.DataFrame()
-    vetor_busca_str = str(modelo_ia.encode(termo_busca).tolist())
+def buscar_livros_por_similaridade(termo_busca, top_n=15, id_usuario=None):
+    if not conn: return pd.DataFrame()
+    try:
+        vetor_busca = servico_codificacao.codificar(termo_busca)
+    except Exception as e:
+        st.error(f"Não foi possível gerar o vetor de busca. Erro: {e}")
+        return pd.DataFrame()
+    vizinhos = indice_vetorial.buscar(vetor_busca, 100) if indice_vetorial is not None else None
+    try:
+        if vizinhos is not None:
+            df_candidatos = buscar_metadados_vizinhos(vizinhos, id_usuario)
+        else:
+            df_candidatos = buscar_vizinhos_no_banco(vetor_busca, id_usuario)
+    except psycopg2.Error as e:
+        st.error(f"Erro na busca por similaridade: {e}")
+        return pd.DataFrame()
+
+    if df_candidatos.empty: return pd.DataFrame()
+    df_candidatos.sort_values(by=['distancia', 'ano_publicacao'], ascending=[True, False], inplace=True)
+    df_filtrado = df_candidatos.groupby('titulo').head(2)
+    return df_filtrado.sort_values(by='distancia').head(top_n)
+
+def buscar_vizinhos_no_banco(vetor_busca, id_usuario=None):
+    """Top-100 por distância calculada no PostgreSQL (pgvector)."""
+    vetor_busca_str = str(vetor_busca.tolist())
     query_sql = """
         SELECT
             l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora,
             l.embedding <-> %s as distancia,
             COALESCE(AVG(NULLIF(a.avaliacao, 0)), 0) AS media_avaliacao,
-            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes
+            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes,
+            MAX(a.avaliacao) FILTER (WHERE a.id_usuario = %s) AS nota_usuario
         FROM Livros l
         LEFT JOIN Avaliacoes a ON l.isbn = a.isbn_livro
         WHERE l.embedding IS NOT NULL
@@ -73,73 +867,93 @@ def buscar_livros_por_similaridade(termo_busca, top_n=15):
         ORDER BY distancia
         LIMIT 100;
     """
-    try:
-        df_candidatos = pd.read_sql_query(query_sql, conn, params=(vetor_busca_str,))
-    except psycopg2.Error as e:
-        st.error(f"Erro na busca por similaridade: {e}")
-        return pd.DataFrame()
+    return ler_sql(query_sql, (vetor_busca_str, id_usuario))
 
-    if df_candidatos.empty: return pd.DataFrame()
-    df_candidatos.sort_values(by=['distancia', 'ano_publicacao'], ascending=[True, False], inplace=True)
-    df_filtrado = df_candidatos.groupby('titulo').head(2)
-    return df_filtrado.sort_values(by='distancia').head(top_n)
+def buscar_metadados_vizinhos(vizinhos, id_usuario=None):
+    """Busca no PostgreSQL apenas os dados e avaliações dos vizinhos encontrados pelo índice em memória."""
+    if not vizinhos: return pd.DataFrame()
+    query_sql = """
+        SELECT
+            l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora,
+            COALESCE(AVG(NULLIF(a.avaliacao, 0)), 0) AS media_avaliacao,
+            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes,
+            MAX(a.avaliacao) FILTER (WHERE a.id_usuario = %s) AS nota_usuario
+        FROM Livros l
+        LEFT JOIN Avaliacoes a ON l.isbn = a.isbn_livro
+        WHERE l.isbn = ANY(%s)
+        GROUP BY l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora;
+    """
+    distancias = dict(vizinhos)
+    df = ler_sql(query_sql, (id_usuario, list(distancias)))
+    df.insert(5, 'distancia', df['isbn'].map(distancias))
+    return df
 
-def buscar_livros_por_autor(nome_autor, top_n=20):
+def buscar_livros_por_autor(nome_autor, top_n=20, id_usuario=None):
     if not conn: return pd.DataFrame()
     query_sql = """
         SELECT
             l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora,
             COALESCE(AVG(NULLIF(a.avaliacao, 0)), 0) AS media_avaliacao,
-            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes
+            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes,
+            MAX(a.avaliacao) FILTER (WHERE a.id_usuario = %s) AS nota_usuario
         FROM Livros l
         LEFT JOIN Avaliacoes a ON l.isbn = a.isbn_livro
         WHERE l.autor ILIKE %s
         GROUP BY l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora
         ORDER BY l.ano_publicacao DESC, total_avaliacoes DESC, media_avaliacao DESC;
     """
-    df = pd.read_sql_query(query_sql, conn, params=(f'%{nome_autor}%',))
+    df = ler_sql(query_sql, (id_usuario, f'%{nome_autor}%'))
     if not df.empty:
         df_filtrado = df.sort_values(by='ano_publicacao', ascending=False).groupby('titulo').head(2)
         return df_filtrado.head(top_n)
     return pd.DataFrame()
 
-def buscar_livros_por_editora(nome_editora, top_n=20):
+def buscar_livros_por_editora(nome_editora, top_n=20, id_usuario=None):
     if not conn: return pd.DataFrame()
     query_sql = """
         SELECT
             l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora,
             COALESCE(AVG(NULLIF(a.avaliacao, 0)), 0) AS media_avaliacao,
-            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes
+            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes,
+            MAX(a.avaliacao) FILTER (WHERE a.id_usuario = %s) AS nota_usuario
         FROM Livros l
         LEFT JOIN Avaliacoes a ON l.isbn = a.isbn_livro
         WHERE l.editora ILIKE %s
         GROUP BY l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora
         ORDER BY l.ano_publicacao DESC, total_avaliacoes DESC, media_avaliacao DESC;
     """
-    df = pd.read_sql_query(query_sql, conn, params=(f'%{nome_editora}%',))
+    df = ler_sql(query_sql, (id_usuario, f'%{nome_editora}%'))
     if not df.empty:
         df_filtrado = df.sort_values(by='ano_publicacao', ascending=False).groupby('titulo').head(2)
         return df_filtrado.head(top_n)
     return pd.DataFrame()
 
-def buscar_livro_por_isbn(isbn):
+def buscar_livro_por_isbn(isbn, id_usuario=None):
     if not conn: return pd.DataFrame()
     query_sql = """
         SELECT
             l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora,
             COALESCE(AVG(NULLIF(a.avaliacao, 0)), 0) AS media_avaliacao,
-            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes
+            COUNT(NULLIF(a.avaliacao, 0)) AS total_avaliacoes,
+            MAX(a.avaliacao) FILTER (WHERE a.id_usuario = %s) AS nota_usuario
         FROM Livros l
         LEFT JOIN Avaliacoes a ON l.isbn = a.isbn_livro
         WHERE l.isbn = %s
         GROUP BY l.isbn, l.titulo, l.autor, l.ano_publicacao, l.editora;
     """
-    df = pd.read_sql_query(query_sql, conn, params=(isbn,))
+    df = ler_sql(query_sql, (id_usuario, isbn))
     return df
 
 def salvar_avaliacao(id_usuario, isbn, avaliacao):
     if not conn: return False, "Sem conexão com o banco."
     avaliacao = int(avaliacao)
+    if servico_avaliacoes is not None:
+        try:
+            # O LSN do commit é registrado pelo próprio serviço quando o lote for gravado.
+            servico_avaliacoes.registrar(id_usuario, isbn, avaliacao)
+            return True, "Avaliação registrada com sucesso!"
+        except OSError as e:
+            return False, f"Erro ao salvar avaliação: {e}"
     update_query = """
         INSERT INTO Avaliacoes (id_usuario, isbn_livro, avaliacao)
         VALUES (%s, %s, %s)
@@ -149,11 +963,17 @@ def salvar_avaliacao(id_usuario, isbn, avaliacao):
         with conn.cursor() as cur:
             cur.execute(update_query, (id_usuario, isbn, avaliacao))
             conn.commit()
+        registrar_escrita()
         return True, "Avaliação registrada com sucesso!"
     except Exception as e:
         conn.rollback()
         return False, f"Erro ao salvar avaliação: {e}"
 
+def buscar_usuario_por_email(conexao, email):
+    with conexao.cursor() as cur:
+        cur.execute("SELECT id_usuario, nome, senha FROM Usuarios WHERE email = %s", (email,))
+        return cur.fetchone()
+
 # --- 3. Gerenciamento de Estado da Sessão ---
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
@@ -182,9 +1002,7 @@ def pagina_login_cadastro():
             submitted = st.form_submit_button("Entrar")
             if submitted:
                 if conn and email and senha:
-                    with conn.cursor() as cur:
-                        cur.execute("SELECT id_usuario, nome, senha FROM Usuarios WHERE email = %s", (email,))
-                        user_data = cur.fetchone()
+                    user_data = executar_leitura(lambda conexao: buscar_usuario_por_email(conexao, email))
                     if user_data and bcrypt.checkpw(senha.encode('utf-8'), user_data[2].encode('utf-8')):
                         st.session_state['logged_in'] = True
                         st.session_state['user_id'] = user_data[0]
@@ -216,6 +1034,7 @@ def pagina_login_cadastro():
                             cur.execute("INSERT INTO Usuarios (nome, email, senha, localizacao) VALUES (%s, %s, %s, %s)",
                                         (nome, email, hash_senha, localizacao))
                             conn.commit()
+                        registrar_escrita()
                         st.success("Usuário cadastrado com sucesso! Por favor, faça o login.")
                         st.balloons()
                         time.sleep(2)
@@ -252,9 +1071,12 @@ def pagina_principal_busca():
         index=('Similaridade de Título (Vetorial)', 'Nome do Autor (Relacional)', 'Nome da Editora (Relacional)', 'ISBN (Busca Exata)').index(st.session_state['last_search_type']),
         key="search_type_select"
     )
+    if 'Vetorial' in tipo_busca_select:
+        # Antecipa o carregamento do modelo enquanto o usuário digita o termo.
+        carregador_modelo.iniciar()
 
     if st.button("Buscar Livros", key="perform_search_btn"):
-        if termo_busca_input and conn and modelo_ia:
+        if termo_busca_input and conn:
             st.session_state['last_search_term'] = termo_busca_input
             st.session_state['last_search_type'] = tipo_busca_select
             st.markdown("---")
@@ -305,9 +1127,15 @@ def pagina_principal_busca():
 
 
 # --- 5. Roteador Principal da Aplicação ---
-if not conn or not modelo_ia:
-    st.error("A aplicação não pôde ser inicializada. Verifique a conexão com o banco e a internet.")
+if not conn:
+    st.error("A aplicação não pôde ser inicializada. Verifique a conexão com o banco.")
 elif st.session_state['logged_in']:
     pagina_principal_busca()
 else:
-    pagina_login_cadastro()
\ No newline at end of file
+    pagina_login_cadastro()
+
+# --- 6. Medição do Cold Start ---
+metricas = metricas_inicializacao()
+if metricas['primeira_renderizacao_s'] is None:
+    metricas['primeira_renderizacao_s'] = time.perf_counter() - INICIO_EXECUCAO
+    print(f"Primeira página renderizada em {metricas['primeira_renderizacao_s']:.3f} s.")
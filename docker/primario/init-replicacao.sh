@@ -0,0 +1,12 @@
+#!/bin/bash
+# Executado apenas na primeira inicialização do primário (volume vazio).
+# Cria o usuário e o slot de replicação e libera as conexões de replicação da réplica.
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE replicador WITH REPLICATION LOGIN PASSWORD 'replicador';
+    -- O slot garante que o primário guarde o WAL que a réplica ainda não recebeu.
+    SELECT pg_create_physical_replication_slot('replica1');
+EOSQL
+
+echo "host replication replicador all scram-sha-256" >> "$PGDATA/pg_hba.conf"
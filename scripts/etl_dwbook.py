@@ -1,17 +1,21 @@
 import pandas as pd
 import psycopg2
 import duckdb
+import os
 import time
 
 # --- NOME DO ARQUIVO DO NOSSO DATA WAREHOUSE LOCAL ---
 ARQUIVO_DW = 'book_crossing_dw.duckdb'
 
+# --- BANCO DE ORIGEM DA EXTRAÇÃO (ex.: LEITOR_BD_ETL=localhost:5433 para ler da réplica) ---
+HOST_BD, PORTA_BD = os.environ.get('LEITOR_BD_ETL', 'localhost:5432').split(':')
+
 # --- 1. ETAPA DE EXTRAÇÃO (EXTRACT) ---
 def extrair_dados_do_postgres():
     """Conecta ao PostgreSQL e extrai as tabelas para DataFrames."""
     print("Conectando ao PostgreSQL para extrair dados...")
     try:
-        conn = psycopg2.connect(host="localhost", port="5432", dbname="book_crossing_db", user="user", password="password")
+        conn = psycopg2.connect(host=HOST_BD, port=PORTA_BD, dbname="book_crossing_db", user="user", password="password")
         
         df_users = pd.read_sql("SELECT * FROM Usuarios", conn)
         df_books = pd.read_sql("SELECT * FROM Livros", conn)
@@ -6,15 +6,18 @@ import time
 # --- NOME DA PASTA ONDE O DATA WAREHOUSE SERÁ SALVO ---
 PASTA_DW_OUTPUT = "data_warehouse_output"
 
+# --- BANCO DE ORIGEM DA EXTRAÇÃO (ex.: LEITOR_BD_ETL=localhost:5433 para ler da réplica) ---
+HOST_BD, PORTA_BD = os.environ.get('LEITOR_BD_ETL', 'localhost:5432').split(':')
+
 # --- 1. ETAPA DE EXTRAÇÃO (EXTRACT) ---
 def extrair_dados_do_postgres():
     """Conecta ao PostgreSQL e extrai as tabelas para DataFrames do Pandas."""
     print("Conectando ao PostgreSQL para extrair dados...")
     try:
-        # Estabelece a conexão com o banco de dados local
+        # Estabelece a conexão com o banco de dados (primário ou réplica)
         conn = psycopg2.connect(
-            host="localhost", 
-            port="5432", 
+            host=HOST_BD, 
+            port=PORTA_BD, 
             dbname="book_crossing_db", 
             user="user", 
             password="password"
@@ -0,0 +1,207 @@
+import psycopg2
+import numpy as np
+import json
+import os
+import sys
+import time
+import uuid
+
+# --- Pasta do índice vetorial lido pelo app_bd.py (LEITOR_MOTOR_VETORIAL=mmap) ---
+PASTA_INDICE = os.environ.get(
+    'LEITOR_PASTA_INDICE', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'indice_vetorial')
+)
+ARQUIVO_MANIFESTO = 'manifesto.json'
+DIMENSAO = 384          # Dimensão do modelo 'all-MiniLM-L6-v2'
+TAMANHO_LOTE = 10000    # Linhas lidas do banco por vez (cursor do lado do servidor)
+
+# Log de alterações de embedding, usado para exportar apenas deltas desde o último snapshot.
+# O "xid" da transação que alterou o livro define a marca d'água: o id (BIGSERIAL) não segue a
+# ordem de commit e uma transação ainda aberta pode gravar um id menor que o último exportado.
+DDL_LOG = """
+    CREATE TABLE IF NOT EXISTS AlteracoesEmbeddings (
+        id BIGSERIAL PRIMARY KEY,
+        isbn VARCHAR(13) NOT NULL,
+        xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+    );
+    ALTER TABLE AlteracoesEmbeddings ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+    CREATE INDEX IF NOT EXISTS idx_alteracoes_embeddings_xid ON AlteracoesEmbeddings (xid);
+
+    CREATE OR REPLACE FUNCTION registrar_alteracao_embedding() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO AlteracoesEmbeddings (isbn) VALUES (OLD.isbn);
+            RETURN OLD;
+        END IF;
+        INSERT INTO AlteracoesEmbeddings (isbn) VALUES (NEW.isbn);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_alteracoes_embedding ON Livros;
+    CREATE TRIGGER trg_alteracoes_embedding
+        AFTER INSERT OR DELETE OR UPDATE OF embedding ON Livros
+        FOR EACH ROW EXECUTE FUNCTION registrar_alteracao_embedding();
+"""
+
+def ler_manifesto():
+    caminho = os.path.join(PASTA_INDICE, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+def salvar_manifesto(manifesto):
+    """Grava o manifesto atomicamente; o app só enxerga segmentos completos."""
+    caminho = os.path.join(PASTA_INDICE, ARQUIVO_MANIFESTO)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+def escrever_segmento(cur, nome, total, removidos=()):
+    """
+    Lê (isbn, embedding) do cursor e grava o segmento em arquivos .npy contíguos,
+    que o app abre com mmap: isbns, matriz float32 (total x DIMENSAO) e normas ao quadrado.
+    """
+    base = os.path.join(PASTA_INDICE, nome)
+    vetores = np.lib.format.open_memmap(base + '_vetores.npy', mode='w+', dtype=np.float32, shape=(total, DIMENSAO))
+    isbns = np.empty(total, dtype='U13')
+    posicao = 0
+    while True:
+        linhas = cur.fetchmany(TAMANHO_LOTE)
+        if not linhas:
+            break
+        fim = posicao + len(linhas)
+        isbns[posicao:fim] = [linha[0] for linha in linhas]
+        vetores[posicao:fim] = np.asarray([linha[1] for linha in linhas], dtype=np.float32)
+        posicao = fim
+        print(f"  {posicao}/{total} vetores exportados.")
+    vetores.flush()
+    np.save(base + '_isbns.npy', isbns[:posicao])
+    np.save(base + '_normas.npy', np.einsum('ij,ij->i', vetores[:posicao], vetores[:posicao]))
+    np.save(base + '_removidos.npy', np.asarray(list(removidos), dtype='U13'))
+    del vetores
+    return {'nome': nome, 'linhas': posicao}
+
+def xmin_do_snapshot(cur):
+    """
+    Menor xid ainda em andamento no snapshot da transação (REPEATABLE READ). Toda alteração
+    com xid menor já terminou e está visível nele; as demais ficam para o próximo export.
+    """
+    cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+    return cur.fetchone()[0]
+
+def exportar_completo(conn):
+    """Snapshot completo de Livros.embedding; descarta os deltas anteriores."""
+    with conn.cursor() as cur:
+        cur.execute(DDL_LOG)
+    conn.commit()
+
+    # Contagem, marca d'água do log e leitura dos vetores vêm do mesmo snapshot (REPEATABLE READ).
+    with conn.cursor() as cur:
+        xmin = xmin_do_snapshot(cur)
+        cur.execute("SELECT COUNT(*) FROM Livros WHERE embedding IS NOT NULL")
+        total = cur.fetchone()[0]
+
+    print(f"Exportando snapshot completo de {total} vetores...")
+    # Nome único: duas exportações no mesmo segundo não podem sobrescrever (e depois apagar) uma à outra.
+    nome = f"base_{xmin}_{uuid.uuid4().hex[:8]}"
+    # Cursor nomeado (do lado do servidor) para não carregar a tabela inteira na memória.
+    with conn.cursor(name='exportar_vetores') as cur:
+        cur.execute("SELECT isbn, embedding::real[] FROM Livros WHERE embedding IS NOT NULL ORDER BY isbn")
+        segmento = escrever_segmento(cur, nome, total)
+    conn.commit()
+
+    # O manifesto novo é salvo antes de podar o log: se o script cair entre os dois passos,
+    # o manifesto antigo continua apontando para um trecho do log que ainda existe.
+    antigo = ler_manifesto()
+    salvar_manifesto({'dimensao': DIMENSAO, 'xmin': xmin, 'segmentos': [segmento]})
+    # Só as alterações já refletidas no snapshot; as de transações abertas naquele momento ficam no log.
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM AlteracoesEmbeddings WHERE xid < %s::text::xid8", (xmin,))
+    conn.commit()
+
+    if antigo:
+        # Os processos do app que ainda mapeiam os arquivos antigos continuam funcionando até recarregar.
+        for seg in antigo['segmentos']:
+            for sufixo in ('_vetores.npy', '_isbns.npy', '_normas.npy', '_removidos.npy'):
+                caminho = os.path.join(PASTA_INDICE, seg['nome'] + sufixo)
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+
+def exportar_delta(conn, manifesto):
+    """Exporta apenas os embeddings alterados desde o último snapshot/delta."""
+    with conn.cursor() as cur:
+        # Alterações de transações terminadas entre a marca d'água anterior e o xmin deste snapshot.
+        xmin = xmin_do_snapshot(cur)
+        intervalo = (manifesto['xmin'], xmin)
+        cur.execute("""
+            SELECT DISTINCT a.isbn
+            FROM AlteracoesEmbeddings a
+            LEFT JOIN Livros l ON l.isbn = a.isbn
+            WHERE a.xid >= %s::text::xid8 AND a.xid < %s::text::xid8 AND l.embedding IS NULL
+        """, intervalo)
+        removidos = [linha[0] for linha in cur.fetchall()]
+        cur.execute("""
+            SELECT COUNT(DISTINCT a.isbn)
+            FROM AlteracoesEmbeddings a
+            JOIN Livros l ON l.isbn = a.isbn
+            WHERE a.xid >= %s::text::xid8 AND a.xid < %s::text::xid8 AND l.embedding IS NOT NULL
+        """, intervalo)
+        total = cur.fetchone()[0]
+        if total == 0 and not removidos:
+            print("✅ Nenhuma alteração desde o último export.")
+            conn.rollback()
+            return
+        print(f"Exportando delta: {total} vetores novos/alterados, {len(removidos)} removidos...")
+        cur.execute("""
+            SELECT l.isbn, l.embedding::real[]
+            FROM Livros l
+            WHERE l.embedding IS NOT NULL AND l.isbn IN (
+                SELECT isbn FROM AlteracoesEmbeddings WHERE xid >= %s::text::xid8 AND xid < %s::text::xid8
+            )
+        """, intervalo)
+        segmento = escrever_segmento(cur, f"delta_{xmin}_{uuid.uuid4().hex[:8]}", total, removidos)
+    conn.commit()
+
+    manifesto['segmentos'].append(segmento)
+    manifesto['xmin'] = xmin
+    salvar_manifesto(manifesto)
+
+def exportar_indice(delta=False):
+    """
+    Exporta Livros.embedding para arquivos memory-mapped usados pela busca
+    vetorial em processo do app. Com --delta, grava apenas as alterações.
+    """
+    start_time = time.time()
+    os.makedirs(PASTA_INDICE, exist_ok=True)
+
+    print("Iniciando conexão com o banco de dados...")
+    try:
+        conn = psycopg2.connect(host="localhost", port="5432", dbname="book_crossing_db", user="user", password="password")
+        conn.set_session(isolation_level='REPEATABLE READ')
+        print("✅ Conexão bem-sucedida!")
+    except Exception as e:
+        print(f"❌ Erro na conexão com o banco de dados: {e}")
+        return
+
+    manifesto = ler_manifesto()
+    if delta and manifesto is not None and 'xmin' not in manifesto:
+        # Manifesto de versões anteriores, com a marca d'água pelo id do log.
+        print("Manifesto sem marca d'água por xid; gerando o snapshot completo.")
+        manifesto = None
+    elif delta and manifesto is None:
+        print("Nenhum snapshot encontrado; gerando o snapshot completo.")
+    if delta and manifesto is not None:
+        exportar_delta(conn, manifesto)
+    else:
+        exportar_completo(conn)
+    conn.close()
+
+    end_time = time.time()
+    print(f"🚀 Índice vetorial exportado em {end_time - start_time:.2f} segundos! ({PASTA_INDICE})")
+
+if __name__ == "__main__":
+    exportar_indice(delta='--delta' in sys.argv)
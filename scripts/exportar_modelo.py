@@ -0,0 +1,53 @@
+import os
+import time
+from sentence_transformers import SentenceTransformer
+
+# --- Pasta local fixa onde o app_bd.py procura o modelo ---
+NOME_MODELO = 'all-MiniLM-L6-v2'
+PASTA_MODELOS = os.environ.get(
+    'LEITOR_PASTA_MODELOS', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'modelos')
+)
+CAMINHO_MODELO_LOCAL = os.path.join(PASTA_MODELOS, NOME_MODELO)
+# Configuração de quantização dinâmica (avx512_vnni, avx512, avx2 ou arm64)
+CONFIG_QUANTIZACAO = os.environ.get('LEITOR_QUANTIZACAO', 'avx512_vnni')
+# Arquivo, ao lado do modelo, com o nome do ONNX exportado; o app e o indexador o leem.
+ARQUIVO_ESCOLHA_ONNX = 'arquivo_onnx.txt'
+
+def exportar_modelo():
+    """
+    Baixa o modelo uma única vez para uma pasta local e exporta uma versão
+    ONNX quantizada (int8) para uso com LEITOR_BACKEND_MODELO=onnx no app.
+    """
+    start_time = time.time()
+
+    # --- 1. Cópia local do modelo (PyTorch) ---
+    print(f"Baixando o modelo '{NOME_MODELO}' para {CAMINHO_MODELO_LOCAL}...")
+    try:
+        model = SentenceTransformer(NOME_MODELO, cache_folder=PASTA_MODELOS)
+        model.save(CAMINHO_MODELO_LOCAL)
+        print("✅ Modelo salvo localmente!")
+    except Exception as e:
+        print(f"❌ Erro ao baixar o modelo: {e}")
+        return
+
+    # --- 2. Exportação ONNX + Quantização (opcional) ---
+    print(f"\nExportando para ONNX e quantizando ({CONFIG_QUANTIZACAO})...")
+    try:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        model_onnx = SentenceTransformer(CAMINHO_MODELO_LOCAL, backend='onnx')
+        model_onnx.save(CAMINHO_MODELO_LOCAL)
+        export_dynamic_quantized_onnx_model(model_onnx, CONFIG_QUANTIZACAO, CAMINHO_MODELO_LOCAL)
+        arquivo_onnx = f"onnx/model_qint8_{CONFIG_QUANTIZACAO}.onnx"
+        with open(os.path.join(CAMINHO_MODELO_LOCAL, ARQUIVO_ESCOLHA_ONNX), 'w', encoding='utf-8') as f:
+            f.write(arquivo_onnx)
+        print(f"✅ Modelo ONNX salvo em {CAMINHO_MODELO_LOCAL}/{arquivo_onnx}")
+    except Exception as e:
+        # O backend PyTorch continua funcionando sem o ONNX.
+        print(f"⚠️ Exportação ONNX não realizada (instale 'sentence-transformers[onnx]'): {e}")
+
+    end_time = time.time()
+    print(f"🚀 Exportação finalizada em {end_time - start_time:.2f} segundos!")
+
+if __name__ == "__main__":
+    exportar_modelo()
@@ -0,0 +1,254 @@
+import psycopg2
+from psycopg2.extras import execute_values
+import os
+import select
+import sys
+import time
+
+# --- Configuração do Worker ---
+CANAL_NOTIFICACAO = 'livros_embedding'
+LOTE_MINIMO = 16        # Tamanho do lote com a fila vazia/pequena
+LOTE_MAXIMO = 1024      # Limite de crescimento do lote em rajadas de inserções
+ESPERA_NOTIFICACAO = 5  # Segundos aguardando um NOTIFY antes de verificar a fila mesmo assim
+INTERVALO_RELATORIO = 30
+ESPERA_RECONEXAO = 5    # Segundos entre tentativas de reconexão após perder o banco
+
+# --- Mesmo modelo local (e modo offline) usado pelo app_bd.py ---
+NOME_MODELO = 'all-MiniLM-L6-v2'
+PASTA_MODELOS = os.environ.get(
+    'LEITOR_PASTA_MODELOS', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'modelos')
+)
+CAMINHO_MODELO_LOCAL = os.path.join(PASTA_MODELOS, NOME_MODELO)
+BACKEND_MODELO = os.environ.get('LEITOR_BACKEND_MODELO', 'torch')
+
+def arquivo_onnx():
+    """Arquivo ONNX do backend 'onnx': o de LEITOR_ARQUIVO_ONNX, o escolhido por
+    scripts/exportar_modelo.py ou, por padrão, o da quantização LEITOR_QUANTIZACAO."""
+    if os.environ.get('LEITOR_ARQUIVO_ONNX'):
+        return os.environ['LEITOR_ARQUIVO_ONNX']
+    caminho_escolha = os.path.join(CAMINHO_MODELO_LOCAL, 'arquivo_onnx.txt')
+    if os.path.exists(caminho_escolha):
+        with open(caminho_escolha, encoding='utf-8') as f:
+            return f.read().strip()
+    return f"onnx/model_qint8_{os.environ.get('LEITOR_QUANTIZACAO', 'avx512_vnni')}.onnx"
+
+# Fila de livros pendentes + trigger que enfileira inserções e mudanças (ou remoção) de título.
+# O campo "versao" evita perder uma mudança de título feita enquanto o livro é processado.
+DDL_FILA = """
+    CREATE TABLE IF NOT EXISTS FilaEmbeddings (
+        isbn VARCHAR(13) PRIMARY KEY REFERENCES Livros(isbn) ON DELETE CASCADE,
+        enfileirado_em TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+        versao BIGINT NOT NULL DEFAULT 1
+    );
+
+    CREATE OR REPLACE FUNCTION enfileirar_embedding() RETURNS trigger AS $$
+    BEGIN
+        -- Título removido também entra na fila: o worker apaga o embedding antigo.
+        IF NEW.titulo IS NOT NULL OR TG_OP = 'UPDATE' THEN
+            INSERT INTO FilaEmbeddings (isbn) VALUES (NEW.isbn)
+            ON CONFLICT (isbn) DO UPDATE SET versao = FilaEmbeddings.versao + 1;
+            PERFORM pg_notify('livros_embedding', NEW.isbn);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trg_livros_embedding ON Livros;
+    CREATE TRIGGER trg_livros_embedding
+        AFTER INSERT OR UPDATE OF titulo ON Livros
+        FOR EACH ROW EXECUTE FUNCTION enfileirar_embedding();
+"""
+
+def conectar():
+    return psycopg2.connect(host="localhost", port="5432", dbname="book_crossing_db", user="user", password="password")
+
+def conectar_listen():
+    conn_listen = conectar()
+    conn_listen.autocommit = True
+    with conn_listen.cursor() as cur:
+        cur.execute(f"LISTEN {CANAL_NOTIFICACAO};")
+    return conn_listen
+
+def carregar_modelo():
+    """Carrega o modelo da pasta local (modo offline) quando disponível, como o app_bd.py."""
+    if os.path.isdir(CAMINHO_MODELO_LOCAL):
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+        origem = CAMINHO_MODELO_LOCAL
+    else:
+        origem = NOME_MODELO
+    # Import depois de configurar o modo offline, que é lido na importação.
+    from sentence_transformers import SentenceTransformer
+
+    if BACKEND_MODELO == 'onnx':
+        return SentenceTransformer(
+            origem, backend='onnx', cache_folder=PASTA_MODELOS, model_kwargs={'file_name': arquivo_onnx()}
+        )
+    return SentenceTransformer(origem, cache_folder=PASTA_MODELOS)
+
+def preparar_fila(conn, backfill=False):
+    """Cria a fila e o trigger; com backfill, enfileira os livros que ainda não têm vetor."""
+    with conn.cursor() as cur:
+        cur.execute(DDL_FILA)
+        if backfill:
+            cur.execute("""
+                INSERT INTO FilaEmbeddings (isbn)
+                SELECT isbn FROM Livros WHERE embedding IS NULL AND titulo IS NOT NULL
+                ON CONFLICT (isbn) DO NOTHING
+            """)
+            print(f"Backfill: {cur.rowcount} livros sem vetor adicionados à fila.")
+    conn.commit()
+
+def processar_lote(conn, model, tamanho_lote):
+    """
+    Lê um lote da fila, gera os embeddings e grava os vetores.
+    Retorna (processou, latencias): se o lote lido da fila não estava vazio e as latências
+    (inserção -> pesquisável), em segundos, dos livros cujo vetor foi gravado.
+    """
+    # --- 1. Leitura do lote, sem locks: o encode (lento) roda fora de qualquer transação ---
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT f.isbn, f.versao, l.titulo, f.enfileirado_em
+            FROM FilaEmbeddings f
+            JOIN Livros l ON l.isbn = f.isbn
+            ORDER BY f.enfileirado_em
+            LIMIT %s
+        """, (tamanho_lote,))
+        lote = cur.fetchall()
+    conn.commit()
+    if not lote:
+        return False, []
+
+    com_titulo = [livro for livro in lote if livro[2] is not None]
+    sem_titulo = [livro[0] for livro in lote if livro[2] is None]
+    embeddings = model.encode([livro[2] for livro in com_titulo], batch_size=len(com_titulo)) if com_titulo else []
+
+    # --- 2. Gravação: trava primeiro as linhas de Livros (em ordem de isbn) e depois a fila,
+    # a mesma ordem do trigger (UPDATE em Livros -> fila), evitando deadlocks. ---
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT isbn FROM Livros WHERE isbn = ANY(%s) ORDER BY isbn FOR UPDATE",
+            ([livro[0] for livro in lote],)
+        )
+        gravados = set()
+        if com_titulo:
+            # Só grava se o título não mudou desde a leitura; caso contrário o livro continua na fila.
+            gravados = {linha[0] for linha in execute_values(cur, """
+                UPDATE Livros SET embedding = data_table.embedding::vector
+                FROM (VALUES %s) AS data_table(isbn, titulo, embedding)
+                WHERE Livros.isbn = data_table.isbn AND Livros.titulo = data_table.titulo
+                RETURNING Livros.isbn
+            """, [(livro[0], livro[2], embeddings[j].tolist()) for j, livro in enumerate(com_titulo)],
+                page_size=len(com_titulo), fetch=True)}
+        if sem_titulo:
+            # Título removido: o livro deixa de aparecer na busca vetorial pelo título antigo.
+            cur.execute(
+                "UPDATE Livros SET embedding = NULL WHERE isbn = ANY(%s) AND titulo IS NULL",
+                (sem_titulo,)
+            )
+
+        # Remove da fila apenas as versões processadas; um título alterado no meio do caminho continua na fila.
+        # Com mais de um worker, um livro pode ser processado duas vezes, mas nunca com um vetor desatualizado.
+        execute_values(cur, """
+            DELETE FROM FilaEmbeddings f
+            USING (VALUES %s) AS proc(isbn, versao)
+            WHERE f.isbn = proc.isbn AND f.versao = proc.versao
+        """, [(livro[0], livro[1]) for livro in lote], page_size=len(lote))
+
+        cur.execute("SELECT clock_timestamp()")
+        agora = cur.fetchone()[0]
+    conn.commit()
+    return True, [(agora - livro[3]).total_seconds() for livro in com_titulo if livro[0] in gravados]
+
+def tamanho_fila(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM FilaEmbeddings")
+        total = cur.fetchone()[0]
+    conn.commit()
+    return total
+
+def rodar_indexador(backfill=False):
+    """
+    Worker contínuo: escuta o canal do trigger (LISTEN/NOTIFY), agrupa os livros
+    pendentes em lotes, gera os embeddings e os grava de volta no banco.
+    """
+    # --- 1. Conexões e Modelo ---
+    print("Iniciando conexões e carregamento do modelo...")
+    try:
+        conn = conectar()
+        conn_listen = conectar_listen()
+        model = carregar_modelo()
+        preparar_fila(conn, backfill)
+        print("✅ Conexões, fila e modelo prontos!")
+    except Exception as e:
+        print(f"❌ Erro na inicialização: {e}")
+        return
+
+    # --- 2. Loop Principal ---
+    tamanho_lote = LOTE_MINIMO
+    latencias = []
+    total_indexados = 0
+    ultimo_relatorio = time.time()
+    print(f"Escutando o canal '{CANAL_NOTIFICACAO}'... (Ctrl+C para encerrar)")
+    try:
+        while True:
+            try:
+                processou, latencias_lote = processar_lote(conn, model, tamanho_lote)
+                if processou:
+                    latencias.extend(latencias_lote)
+                    total_indexados += len(latencias_lote)
+                    backlog = tamanho_fila(conn)
+                    # Em rajadas o lote cresce (dobra) para acompanhar a fila; com a fila pequena, volta a diminuir.
+                    if backlog > tamanho_lote:
+                        tamanho_lote = min(tamanho_lote * 2, LOTE_MAXIMO)
+                    elif backlog < tamanho_lote // 4:
+                        tamanho_lote = max(tamanho_lote // 2, LOTE_MINIMO)
+                elif select.select([conn_listen], [], [], ESPERA_NOTIFICACAO) != ([], [], []):
+                    # Fila vazia: espera por um NOTIFY (ou pelo timeout) e descarta as notificações acumuladas.
+                    conn_listen.poll()
+                    conn_listen.notifies.clear()
+
+                if time.time() - ultimo_relatorio >= INTERVALO_RELATORIO:
+                    if latencias:
+                        latencias.sort()
+                        p50 = latencias[len(latencias) // 2]
+                        p95 = latencias[int(len(latencias) * 0.95)]
+                        print(f"  Indexados: {total_indexados} | Fila: {tamanho_fila(conn)} | Lote: {tamanho_lote} | "
+                              f"Latência inserção->pesquisável p50={p50:.2f}s p95={p95:.2f}s max={latencias[-1]:.2f}s")
+                        latencias = []
+                    else:
+                        print(f"  Indexados: {total_indexados} | Fila: {tamanho_fila(conn)} | Lote: {tamanho_lote}")
+                    ultimo_relatorio = time.time()
+            except psycopg2.Error as e:
+                # Erros do banco (deadlock, conexão perdida...) não derrubam o worker: o lote volta a ser lido.
+                print(f"⚠️ Erro no banco, tentando novamente: {e}")
+                conn, conn_listen = recuperar_conexoes(conn, conn_listen)
+    except KeyboardInterrupt:
+        print("\nEncerrando o indexador...")
+    finally:
+        for c in (conn, conn_listen):
+            if c is not None and not c.closed:
+                c.close()
+        print(f"🚀 Indexador finalizado. {total_indexados} livros indexados nesta execução.")
+
+def recuperar_conexoes(conn, conn_listen):
+    """Desfaz a transação atual ou, se as conexões caíram, reconecta até conseguir."""
+    if not conn.closed and not conn_listen.closed:
+        try:
+            conn.rollback()
+            time.sleep(1)  # Evita girar em falso se o erro se repetir a cada tentativa.
+            return conn, conn_listen
+        except psycopg2.Error:
+            pass
+    for c in (conn, conn_listen):
+        if not c.closed:
+            c.close()
+    while True:
+        time.sleep(ESPERA_RECONEXAO)
+        try:
+            return conectar(), conectar_listen()
+        except psycopg2.Error as e:
+            print(f"⚠️ Banco indisponível, nova tentativa em {ESPERA_RECONEXAO}s: {e}")
+
+if __name__ == "__main__":
+    rodar_indexador(backfill='--backfill' in sys.argv)